@@ -31,4 +31,16 @@ INITIAL_POP = [0.6, 0.38, 0.02] # [Healthy, Sensitive, Resistant] - 1% Resistanc
 
 # 3. TIME SETTINGS
 TIME_STEPS = 200        # How long to run the simulation
-DT = 0.1                # Step size
\ No newline at end of file
+DT = 0.1                # Step size
+
+# 4. FINITE-POPULATION SETTINGS (stochastic_simulation.py)
+POPULATION_SIZE = 1e6   # Number of cells in the well-mixed tumor + tissue
+TAU_EPSILON = 0.03      # Max relative change per type in one tau-leap
+
+# 5. CALIBRATION SETTINGS (calibration.py)
+CALIBRATION_STARTS = 8      # Multi-start fits per patient
+CALIBRATION_SCREEN = 4      # Candidate starts screened per kept start
+CALIBRATION_MAX_ITER = 50   # Levenberg-Marquardt iterations
+CALIBRATION_SPREAD = 0.2    # Relative perturbation of the extra starting points
+CALIBRATION_TOL = 1e-3      # Stop when the relative cost gain falls below this
+CALIBRATION_GTOL = 1e-3     # ... or when the scaled gradient falls below this
@@ -1,18 +1,30 @@
 import config
+import simulation
+
+def piecewise_constant(*segments):
+    """
+    Builds a fixed-schedule policy from (start time, dose) segments, each
+    dose held until the next start. The policy returns the scheduled dose
+    and carries the segments as `.schedule`, so simulation.run can look up
+    the whole dose history at once instead of calling it every step.
+    """
+    schedule = list(segments)
+    def policy(t, x, state):
+        return float(simulation.schedule_doses(schedule, t))
+    policy.schedule = schedule
+    return policy
 
 # ==========================================
 # POLICY A: MTD (Maximum Tolerated Dose)
 # ==========================================
-def mtd_policy(t, x, state):
-    # Logic: Hit it with everything we have, always.
-    return 1.0
+# Logic: Hit it with everything we have, always.
+mtd_policy = piecewise_constant((0, 1.0))
 
 # ==========================================
 # POLICY B: METRONOMIC (Low Continuous)
 # ==========================================
-def metronomic_policy(t, x, state):
-    # Logic: Keep dose low but constant.
-    return 0.4
+# Logic: Keep dose low but constant.
+metronomic_policy = piecewise_constant((0, 0.4))
 
 # ==========================================
 # POLICY C: ADAPTIVE THERAPY (Nash)
@@ -2,10 +2,43 @@ import numpy as np
 import dynamics
 import config
 
+def advance(x, t, drug):
+    """
+    Advances the population by one DT step at a fixed drug dose.
+    """
+    # 1. Calculate Gradient (dx/dt)
+    # Using RK4 for stability
+    k1 = dynamics.replicator_dynamics(x, t, drug)
+    k2 = dynamics.replicator_dynamics(x + 0.5*config.DT*k1, t, drug)
+    k3 = dynamics.replicator_dynamics(x + 0.5*config.DT*k2, t, drug)
+    k4 = dynamics.replicator_dynamics(x + config.DT*k3, t, drug)
+    
+    # 2. Update Population
+    x = x + (config.DT / 6.0) * (k1 + 2*k2 + 2*k3 + k4)
+    
+    # 3. Normalize (Ensure sum = 1.0 to prevent drift)
+    x = np.maximum(x, 0) # No negative populations
+    return x / np.sum(x)
+
+def schedule_doses(schedule, times):
+    """
+    Dose at each time from a piecewise-constant (start time, dose) schedule.
+    """
+    starts = np.array([start for start, _ in schedule], dtype=float)
+    doses = np.array([dose for _, dose in schedule], dtype=float)
+    idx = np.searchsorted(starts, times, side='right') - 1
+    return np.where(idx >= 0, doses[np.maximum(idx, 0)], 0.0)
+
 def run(policy_func):
     # Setup Time
     time_points = np.arange(0, config.TIME_STEPS, config.DT)
     
+    # Fixed schedules (policies.piecewise_constant) skip the per-step
+    # policy calls
+    schedule = getattr(policy_func, 'schedule', None)
+    if schedule is not None:
+        planned_doses = schedule_doses(schedule, time_points[1:])
+    
     # Setup State
     x = np.array(config.INITIAL_POP)
     history_x = [x]
@@ -17,27 +50,19 @@ def run(policy_func):
     current_toxicity = 0.0
     
     # Integration Loop (Manual Euler/RK1 for transparency with stateful policies)
-    for t in time_points[1:]:
+    for i, t in enumerate(time_points[1:]):
         
         # 1. Get Drug Decision
-        drug = policy_func(t, x, policy_state)
+        if schedule is not None:
+            drug = planned_doses[i]
+        else:
+            drug = policy_func(t, x, policy_state)
 
         # 2. Accumulate Toxicity
         current_toxicity += drug * config.DT
         
-        # 3. Calculate Gradient (dx/dt)
-        # Using RK4 for stability
-        k1 = dynamics.replicator_dynamics(x, t, drug)
-        k2 = dynamics.replicator_dynamics(x + 0.5*config.DT*k1, t, drug)
-        k3 = dynamics.replicator_dynamics(x + 0.5*config.DT*k2, t, drug)
-        k4 = dynamics.replicator_dynamics(x + config.DT*k3, t, drug)
-        
         # 3. Update Population
-        x = x + (config.DT / 6.0) * (k1 + 2*k2 + 2*k3 + k4)
-        
-        # 4. Normalize (Ensure sum = 1.0 to prevent drift)
-        x = np.maximum(x, 0) # No negative populations
-        x = x / np.sum(x)
+        x = advance(x, t, drug)
         
         # Save
         history_x.append(x)
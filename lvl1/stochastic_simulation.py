@@ -0,0 +1,121 @@
+import numpy as np
+import dynamics
+import config
+
+# ==========================================
+# FINITE-POPULATION (STOCHASTIC) LEVEL 1
+# ==========================================
+# Moran-style birth-death process on a well-mixed population of N cells.
+# Each cell of type i divides at rate f_i (from dynamics.calculate_fitness)
+# and every birth displaces a random cell, so the expected change is
+#     dn_i/dt = n_i * (f_i - average_f)
+# i.e. the replicator ODE in the large-N limit, plus demographic noise
+# (resistant clones can go extinct or emerge by chance).
+#
+# Events are simulated with tau-leaping: over a leap of length tau,
+# births ~ Poisson(n_i * f_i * tau) and the displaced cells are drawn
+# multinomially from the current population. The leap size adapts so no
+# type changes by more than TAU_EPSILON of its size (Cao et al. 2006).
+# All replicates advance together as one batch.
+
+def select_tau(n, f, max_tau):
+    """
+    Adaptive leap size per replicate.
+    n, f: (replicates, 3) counts and fitness. Returns (replicates,) taus.
+    """
+    total = np.maximum(n.sum(axis=1, keepdims=True), 1)
+    avg_f = (n * f).sum(axis=1, keepdims=True) / total
+
+    # Expected drift and variance of each type's count per unit time
+    mean = np.abs(n * (f - avg_f))
+    var = n * (f + avg_f)
+
+    bound = np.maximum(config.TAU_EPSILON * n, 1.0)
+    with np.errstate(divide='ignore'):
+        tau_mean = np.where(mean > 0, bound / mean, np.inf)
+        tau_var = np.where(var > 0, bound**2 / var, np.inf)
+
+    tau = np.minimum(tau_mean, tau_var).min(axis=1)
+    return np.minimum(tau, max_tau)
+
+def leap(n, f, tau, rng):
+    """
+    One tau-leap of the birth-death process for the whole batch.
+    """
+    total = np.maximum(n.sum(axis=1), 1)
+
+    # 1. Births (each type independently)
+    births = rng.poisson(n * f * tau[:, None])
+
+    # 2. Deaths: every newborn displaces a random existing cell
+    displaced = np.minimum(births.sum(axis=1), total).astype(np.int64)
+    deaths = rng.multinomial(displaced, n / total[:, None])
+
+    # 3. Update (a type that loses more than it has goes extinct)
+    return np.maximum(n + births - deaths, 0)
+
+def run(policy_func, population_size=None, replicates=1, seed=None):
+    """
+    Stochastic counterpart of simulation.run.
+    Returns (time, x, drug, toxicity) like simulation.run; with
+    replicates > 1, x is (steps, replicates, 3) and drug/toxicity are
+    (steps, replicates).
+    """
+    if population_size is None:
+        population_size = config.POPULATION_SIZE
+    rng = np.random.default_rng(seed)
+
+    # Setup Time
+    time_points = np.arange(0, config.TIME_STEPS, config.DT)
+
+    # Setup State (cell counts, one row per replicate)
+    start = np.round(np.array(config.INITIAL_POP) * population_size)
+    n = np.tile(start, (replicates, 1))
+    x = n / n.sum(axis=1, keepdims=True)
+
+    history_x = [x]
+    history_drug = [np.zeros(replicates)]
+    history_tox = [np.zeros(replicates)]
+
+    # Policy Memory (one State Dictionary per replicate)
+    policy_states = [{} for _ in range(replicates)]
+    current_toxicity = np.zeros(replicates)
+
+    for t in time_points[1:]:
+
+        # 1. Get Drug Decision (policies are per patient)
+        drug = np.array([policy_func(t, x[r], policy_states[r]) for r in range(replicates)], dtype=float)
+
+        # 2. Accumulate Toxicity
+        current_toxicity = current_toxicity + drug * config.DT
+
+        # 3. Leap through the interval (adaptive sub-steps, drug held constant)
+        remaining = np.full(replicates, config.DT)
+        while np.any(remaining > 0):
+            active = remaining > 0
+            n_a = n[active]
+            x_a = n_a / np.maximum(n_a.sum(axis=1, keepdims=True), 1)
+
+            f = dynamics.calculate_fitness(x_a.T, drug[active]).T
+            tau = select_tau(n_a, f, remaining[active])
+
+            n[active] = leap(n_a, f, tau, rng)
+            remaining[active] -= tau
+
+        # 4. Fractions (guard against a fully extinct population)
+        totals = n.sum(axis=1, keepdims=True)
+        x = n / np.maximum(totals, 1)
+
+        # Save
+        history_x.append(x)
+        history_drug.append(drug)
+        history_tox.append(current_toxicity)
+
+    history_x = np.array(history_x)
+    history_drug = np.array(history_drug)
+    history_tox = np.array(history_tox)
+
+    # Single patient: same shapes as the deterministic run
+    if replicates == 1:
+        return time_points, history_x[:, 0], history_drug[:, 0], history_tox[:, 0]
+    return time_points, history_x, history_drug, history_tox
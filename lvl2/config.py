@@ -28,10 +28,22 @@ TOX_LIMIT = 400.0
 # 3. SPATIAL SETTINGS
 GRID_SIZE = 50         
 NATURAL_DEATH_RATE = 0.05
+DRUG_DEATH_RATE = 0.15  # Extra death probability of Sensitive cells per unit dose
+
+# Lattice topology (see spatial_topology.py)
+NEIGHBORHOOD = 'moore'  # 'moore' (8), 'von_neumann' (4) or 'hexagonal' (6)
+BOUNDARY = 'periodic'   # 'periodic' (torus) or 'closed' (no cells past the edge)
 
 # 4. TIME SETTINGS
 TIME_STEPS = 5000       
 DT = 1.0               
 
 # 5. VISUALIZATION
-SNAPSHOT_INTERVAL = 100 # Fallback interval
\ No newline at end of file
+SNAPSHOT_INTERVAL = 100 # Fallback interval
+
+# 6. TRAJECTORY RECORDING
+KEYFRAME_INTERVAL = 250 # Full grid stored every N steps (deltas in between)
+
+# 7. HYBRID MODE (spatial_hybrid.py)
+HYBRID_BLOCK_SIZE = 10  # Cells per side of a coarse block (must divide GRID_SIZE)
+HYBRID_MARGIN = 1       # Blocks within this many blocks of a tumor cell are kept as agents
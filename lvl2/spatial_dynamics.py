@@ -1,27 +1,29 @@
 import numpy as np
-import scipy.signal
+import spatial_topology
 import config
 
-# Kernel for Moore Neighborhood (8 neighbors)
-KERNEL = np.array([[1, 1, 1],
-                   [1, 0, 1],
-                   [1, 1, 1]])
-
-def get_neighbor_counts(grid):
-    # Create binary masks for each type
-    h_mask = (grid == 1).astype(int)
-    s_mask = (grid == 2).astype(int)
-    r_mask = (grid == 3).astype(int)
+def get_neighbor_counts(grid, cells=None):
+    # Neighbor table for the configured lattice (built once per grid shape)
+    table = spatial_topology.get_neighbor_table(grid.shape)
+    # Optionally only a subset of cells (flat indices) -> 1D counts
+    if cells is not None:
+        table = table[cells]
+    
+    # Type of every neighbor of every cell: (num_cells, k)
+    neighbor_types = spatial_topology.with_sentinel(grid.ravel())[table]
     
-    # Convolve to count neighbors
-    h_count = scipy.signal.convolve2d(h_mask, KERNEL, mode='same', boundary='wrap')
-    s_count = scipy.signal.convolve2d(s_mask, KERNEL, mode='same', boundary='wrap')
-    r_count = scipy.signal.convolve2d(r_mask, KERNEL, mode='same', boundary='wrap')
+    # Count neighbors of each type
+    h_count = np.count_nonzero(neighbor_types == 1, axis=1)
+    s_count = np.count_nonzero(neighbor_types == 2, axis=1)
+    r_count = np.count_nonzero(neighbor_types == 3, axis=1)
     
+    if cells is None:
+        return h_count.reshape(grid.shape), s_count.reshape(grid.shape), r_count.reshape(grid.shape)
     return h_count, s_count, r_count
 
-def calculate_fitness_grid(grid, drug_conc):
-    h_n, s_n, r_n = get_neighbor_counts(grid)
+def calculate_fitness_grid(grid, drug_conc, cells=None):
+    # With `cells` (flat indices), returns the fitness of those cells only
+    h_n, s_n, r_n = get_neighbor_counts(grid, cells)
     total_neighbors = h_n + s_n + r_n
     total_neighbors[total_neighbors == 0] = 1 
     
@@ -48,9 +50,18 @@ def calculate_fitness_grid(grid, drug_conc):
     fit_s = (1 - w + w * payoff_s) - (drug_conc * config.DRUG_KILL_POWER)
     fit_r = 1 - w + w * payoff_r
     
-    fitness_grid = np.zeros_like(grid, dtype=float)
-    fitness_grid[grid == 1] = fit_h[grid == 1]
-    fitness_grid[grid == 2] = fit_s[grid == 2]
-    fitness_grid[grid == 3] = fit_r[grid == 3]
+    types = grid if cells is None else grid.ravel()[cells]
+    fitness_grid = np.zeros_like(types, dtype=float)
+    fitness_grid[types == 1] = fit_h[types == 1]
+    fitness_grid[types == 2] = fit_s[types == 2]
+    fitness_grid[types == 3] = fit_r[types == 3]
     
-    return np.maximum(fitness_grid, 0.0)
\ No newline at end of file
+    return np.maximum(fitness_grid, 0.0)
+
+def death_probabilities(types, drug_conc):
+    # Per-cell death probability for an array of cell types (any shape);
+    # the drug only adds to the Sensitive cells' rate
+    death_probs = np.full(np.shape(types), config.NATURAL_DEATH_RATE)
+    if drug_conc > 0:
+        death_probs[types == 2] += (drug_conc * config.DRUG_DEATH_RATE)
+    return death_probs
@@ -0,0 +1,145 @@
+import numpy as np
+import spatial_topology
+import spatial_dynamics
+import config
+
+# ==========================================
+# HYBRID CONTINUUM-AGENT MODE
+# ==========================================
+# The lattice is split into square blocks of HYBRID_BLOCK_SIZE cells.
+#   - Fine blocks (near the tumor) are simulated cell by cell as usual.
+#   - Coarse blocks (tumor-free, far from the tumor) are only a density
+#     vector [H, S, R] advanced with a Level 1 style replicator update.
+# Their cells stay in the grid as a frozen sample, so fine cells on the
+# border still see neighbors, and plots/census keep working.
+# When a tumor cell comes within HYBRID_MARGIN blocks, the block is refined:
+# its cells are re-sampled from the density and handed back to the agents.
+# Blocks are coarsened again once the tumor is HYBRID_MARGIN + 1 blocks away
+# (the extra block avoids flipping back and forth).
+
+def init_state(grid):
+    """
+    Builds the hybrid bookkeeping for a grid and coarsens the far blocks.
+    """
+    bs = config.HYBRID_BLOCK_SIZE
+    rows, cols = grid.shape
+    if rows % bs or cols % bs:
+        raise ValueError(f"Grid {grid.shape} is not divisible into {bs}x{bs} blocks")
+    blocks = (rows // bs, cols // bs)
+
+    # Flat cell indices of every block: (num_blocks, bs*bs)
+    cell_ids = np.arange(rows * cols).reshape(blocks[0], bs, blocks[1], bs)
+    block_cells = cell_ids.transpose(0, 2, 1, 3).reshape(blocks[0] * blocks[1], bs * bs)
+
+    state = {
+        'blocks': blocks,
+        'block_cells': block_cells,
+        'coarse': np.zeros(blocks, dtype=bool),
+        'density': np.zeros((blocks[0] * blocks[1], 3)),
+        'fine_cells': np.arange(rows * cols),
+        'num_neighbors': spatial_topology.get_neighbor_table(grid.shape).shape[1],
+    }
+    update_resolution(grid, state)
+    return state
+
+def _dilate(mask, radius):
+    # Grow a block mask by `radius` blocks (wraps around; on a closed
+    # boundary this only refines a few extra edge blocks)
+    for axis in (0, 1):
+        grown = mask.copy()
+        for shift in range(1, radius + 1):
+            grown |= np.roll(mask, shift, axis=axis) | np.roll(mask, -shift, axis=axis)
+        mask = grown
+    return mask
+
+def update_resolution(grid, state):
+    """
+    Refines coarse blocks the tumor is approaching and coarsens fine blocks
+    it has left.
+    """
+    blocks = state['blocks']
+    bs = config.HYBRID_BLOCK_SIZE
+    coarse = state['coarse']
+
+    # Tumor cells per block (coarse blocks never hold tumor cells)
+    tumor = (grid > 1).reshape(blocks[0], bs, blocks[1], bs).any(axis=(1, 3))
+    near = _dilate(tumor, config.HYBRID_MARGIN)
+    far = ~_dilate(tumor, config.HYBRID_MARGIN + 1)
+
+    refine = (coarse & near).ravel()
+    coarsen = (~coarse & far).ravel()
+    if not refine.any() and not coarsen.any():
+        return
+
+    flat = grid.ravel()
+
+    # 1. Refine: sample agents from the block density
+    for b in np.flatnonzero(refine):
+        cells = state['block_cells'][b]
+        edges = np.cumsum(state['density'][b])
+        flat[cells] = np.searchsorted(edges, np.random.random(len(cells)), side='right') + 1
+        flat[cells[flat[cells] == 4]] = 0  # Beyond the occupied fraction -> Empty
+
+    # 2. Coarsen: the block's current composition becomes its density
+    for b in np.flatnonzero(coarsen):
+        counts = np.bincount(flat[state['block_cells'][b]], minlength=4)
+        state['density'][b] = counts[1:] / counts.sum()
+
+    coarse[refine.reshape(blocks)] = False
+    coarse[coarsen.reshape(blocks)] = True
+    state['fine_cells'] = np.sort(state['block_cells'][~coarse.ravel()].ravel())
+
+def block_fitness(density, drug_conc):
+    """
+    Mean-field fitness of each type in each block (Level 1 formula with
+    the spatial payoff matrix). density: (num_blocks, 3) -> (num_blocks, 3)
+    """
+    occupied = density.sum(axis=1, keepdims=True)
+    prop = density / np.maximum(occupied, 1e-12)
+    payoff = prop @ config.PAYOFF_MATRIX.T
+
+    w = config.W0
+    fitness = 1 - w + w * payoff
+    fitness[:, 1] -= drug_conc * config.DRUG_KILL_POWER
+    return np.maximum(fitness, 0.0)
+
+def coarse_fitness_map(grid, state, drug_conc):
+    """
+    Fitness map where every cell of a coarse block carries the mean-field
+    fitness of its type (fine cells are filled in by the caller).
+    """
+    fitness = block_fitness(state['density'], drug_conc)
+    fitness_map = np.zeros(grid.size)
+    flat = grid.ravel()
+
+    cells = state['block_cells'][state['coarse'].ravel()]
+    block_ids = np.broadcast_to(np.flatnonzero(state['coarse'].ravel())[:, None], cells.shape)
+    types = flat[cells]
+    occupied = types > 0
+    fitness_map[cells[occupied]] = fitness[block_ids[occupied], types[occupied] - 1]
+    return fitness_map.reshape(grid.shape)
+
+def advance_coarse(state, drug_conc):
+    """
+    One step for all coarse blocks: death, then fitness-proportional refill
+    of the empty space (mean-field version of spatial_simulation.step).
+    """
+    coarse = state['coarse'].ravel()
+    if not coarse.any():
+        return
+    x = state['density'][coarse]
+    fitness = block_fitness(x, drug_conc)
+
+    # 1. Death
+    death = spatial_dynamics.death_probabilities(np.array([1, 2, 3]), drug_conc)
+    x = x * (1 - death)
+
+    # 2. Refill: an empty cell is filled if any of its k neighbors is occupied
+    empty = 1 - x.sum(axis=1, keepdims=True)
+    refill = empty * (1 - empty**state['num_neighbors'])
+
+    growth = x * fitness
+    total = growth.sum(axis=1, keepdims=True)
+    x = x + np.where(total > 0, refill * growth / np.maximum(total, 1e-12), 0.0)
+
+    state['density'][coarse] = x
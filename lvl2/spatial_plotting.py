@@ -70,25 +70,45 @@ def plot_stats(experiments):
     plt.savefig("spatial_stats.png")
     print("Saved spatial_stats.png")
 
-def plot_grids(experiments):
+def get_grid_frames(name, data, times=None):
+    """
+    Returns (grids, times) to draw for one experiment.
+    Uses the recorded trajectory when arbitrary times are requested,
+    otherwise the fixed snapshots taken during the run.
+    """
+    if times is None:
+        return data['snapshots'], data['snap_times']
+    
+    trajectory = data.get('trajectory')
+    if trajectory is None:
+        raise ValueError(f"Experiment '{name}' has no recorded trajectory; "
+                         "run it with record_trajectory=True to plot arbitrary times")
+    
+    # Only times the patient actually reached (run may end early)
+    reached = [t for t in times if t < len(trajectory)]
+    return [trajectory.get_grid(t) for t in reached], reached
+
+def plot_grids(experiments, times=None):
     """
     Plots snapshots of the grid at different time steps.
     Handles cases where some experiments end early (death).
+    Pass `times` to pull arbitrary steps from runs recorded with
+    record_trajectory=True.
     """
     targets = list(experiments.keys())
+    frames = {name: get_grid_frames(name, experiments[name], times) for name in targets}
     
     # 1. Find the maximum number of snapshots across ALL experiments
     # (Because Stackelberg survived, it has more snaps than MTD)
     max_snaps = 0
     for name in targets:
-        max_snaps = max(max_snaps, len(experiments[name]['snapshots']))
+        max_snaps = max(max_snaps, len(frames[name][0]))
     
     # 2. Setup Subplots with squeeze=False to force 2D array behavior
     fig, axes = plt.subplots(len(targets), max_snaps, figsize=(3 * max_snaps, 16), squeeze=False)
     
     for i, name in enumerate(targets):
-        snaps = experiments[name]['snapshots']
-        times = experiments[name]['snap_times']
+        snaps, snap_times = frames[name]
         
         for j in range(max_snaps):
             ax = axes[i, j]
@@ -97,7 +117,7 @@ def plot_grids(experiments):
             if j < len(snaps):
                 grid = snaps[j]
                 ax.imshow(grid, cmap=CMAP, norm=NORM)
-                if i == 0: ax.set_title(f"Time: {times[j]}")
+                if i == 0: ax.set_title(f"Time: {snap_times[j]}")
             else:
                 # If the patient died early, show a "Dead" placeholder
                 ax.text(0.5, 0.5, "PATIENT\nDIED", ha='center', va='center', color='red', fontweight='bold')
@@ -0,0 +1,124 @@
+import bisect
+import numpy as np
+import config
+
+# ==========================================
+# COMPRESSED TRAJECTORY RECORDING
+# ==========================================
+# Every step of the run is stored so any time point can be replayed later
+# without re-running the simulation.
+#   - Keyframes: full uint8 copy of the grid every KEYFRAME_INTERVAL steps
+#   - Deltas: only the cells that changed since the previous step
+#       * positions are gap-coded (distance to the previous changed cell)
+#       * new cell types are run-length coded (value, run length)
+# A grid is rebuilt from the closest keyframe at or before the requested
+# step, then the deltas up to that step are applied on top.
+
+class TrajectoryRecorder:
+    def __init__(self, keyframe_interval=None):
+        if keyframe_interval is None:
+            keyframe_interval = config.KEYFRAME_INTERVAL
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+
+        self.shape = None
+        self.index_dtype = None
+        self.num_steps = 0
+
+        # Keyframe index: sorted step numbers + matching flat grids
+        self.keyframe_steps = []
+        self.keyframes = []
+
+        # One entry per step (None for keyframe steps)
+        self.deltas = []
+
+        self._last = None
+
+    def record(self, grid):
+        """
+        Appends the grid state for the next step.
+        """
+        flat = np.asarray(grid).ravel().astype(np.uint8)
+
+        if self.shape is None:
+            self.shape = np.asarray(grid).shape
+            # Gaps and run lengths never exceed the number of cells
+            if flat.size <= np.iinfo(np.uint16).max:
+                self.index_dtype = np.uint16
+            else:
+                self.index_dtype = np.uint32
+
+        step = self.num_steps
+        if step % self.keyframe_interval == 0:
+            self.keyframe_steps.append(step)
+            self.keyframes.append(flat.copy())
+            self.deltas.append(None)
+        else:
+            self.deltas.append(self._encode_delta(self._last, flat))
+
+        self._last = flat
+        self.num_steps += 1
+
+    def _encode_delta(self, prev, flat):
+        changed = np.flatnonzero(prev != flat)
+        if len(changed) == 0:
+            empty = np.zeros(0, dtype=self.index_dtype)
+            return empty, np.zeros(0, dtype=np.uint8), empty
+
+        # 1. Positions -> gaps between consecutive changed cells
+        gaps = np.diff(changed, prepend=0).astype(self.index_dtype)
+
+        # 2. New values -> run-length coding
+        values = flat[changed]
+        run_starts = np.flatnonzero(np.diff(values.astype(np.int16), prepend=-1) != 0)
+        run_values = values[run_starts]
+        run_lengths = np.diff(np.append(run_starts, len(values))).astype(self.index_dtype)
+
+        return gaps, run_values, run_lengths
+
+    def _apply_delta(self, flat, delta):
+        gaps, run_values, run_lengths = delta
+        if len(gaps) == 0:
+            return
+        positions = np.cumsum(gaps, dtype=np.int64)
+        flat[positions] = np.repeat(run_values, run_lengths)
+
+    def get_grid(self, step):
+        """
+        Reconstructs the grid after the given step (random access).
+        """
+        if step < 0:
+            step += self.num_steps
+        if not 0 <= step < self.num_steps:
+            raise IndexError(f"Step {step} not recorded (0..{self.num_steps - 1})")
+
+        # Nearest keyframe at or before the requested step
+        k = bisect.bisect_right(self.keyframe_steps, step) - 1
+        start = self.keyframe_steps[k]
+        flat = self.keyframes[k].copy()
+
+        for s in range(start + 1, step + 1):
+            self._apply_delta(flat, self.deltas[s])
+
+        # Match the int grids used by the simulation
+        return flat.reshape(self.shape).astype(int)
+
+    def nbytes(self):
+        """
+        Memory used by the compressed trajectory.
+        """
+        total = sum(k.nbytes for k in self.keyframes)
+        for delta in self.deltas:
+            if delta is not None:
+                total += sum(part.nbytes for part in delta)
+        return total
+
+    def raw_nbytes(self):
+        """
+        Memory a full int grid copy per step would have used.
+        """
+        if self.shape is None:
+            return 0
+        return self.num_steps * int(np.prod(self.shape)) * np.dtype(int).itemsize
+
+    def __len__(self):
+        return self.num_steps
@@ -1,7 +1,87 @@
 import numpy as np
 import spatial_dynamics
+import spatial_topology
+import spatial_recording
+import spatial_hybrid
 import config
 
+def pick_winners(types, fits, rolls):
+    """
+    Fitness-proportional choice of one neighbor per row.
+    types/fits: (num_cells, k) neighbor types and fitness, rolls: uniform [0, 1).
+    Returns the winning type per row (0 if no neighbor can reproduce).
+    """
+    fits = np.where(types != 0, fits, 0.0)
+    cum = np.cumsum(fits, axis=1)
+    total = cum[:, -1]
+    
+    # First neighbor whose cumulative weight passes the roll
+    idx = np.count_nonzero(cum <= (rolls * total)[:, None], axis=1)
+    idx = np.minimum(idx, types.shape[1] - 1)
+    winners = types[np.arange(len(types)), idx]
+    winners[total <= 0] = 0
+    return winners
+
+def reproduce(grid, fitness_map, mutation_rate=0.0, cells=None):
+    """
+    Fills empty cells with a copy of a fitness-weighted neighbor.
+    Empty cells are visited in random order and a cell filled earlier in
+    the sweep can already seed the ones visited after it.
+    `cells` (flat indices) restricts which empty cells are considered.
+    """
+    flat = grid.ravel()
+    if cells is None:
+        empty = np.flatnonzero(flat == 0)
+    else:
+        empty = cells[flat[cells] == 0]
+    if len(empty) == 0:
+        return grid
+    
+    # 1. Random visit order
+    empty = empty[np.random.permutation(len(empty))]
+    
+    # 2. Gather neighbor types / fitness for every empty cell at once
+    table = spatial_topology.get_neighbor_table(grid.shape)
+    neighbors = table[empty]
+    types = spatial_topology.with_sentinel(flat)[neighbors]
+    fits = spatial_topology.with_sentinel(fitness_map.ravel(), 0.0)[neighbors]
+    
+    rolls = np.random.random(len(empty))
+    mutation_rolls = np.random.random(len(empty))
+    
+    winners = pick_winners(types, fits, rolls)
+    winners[(winners == 2) & (mutation_rolls < mutation_rate)] = 3
+    
+    # 3. Cells next to an empty cell visited EARLIER depend on the visit
+    # order. Group them into waves: a cell's wave is one more than the
+    # deepest earlier-visited empty neighbor, so cells in the same wave never
+    # depend on each other and each wave is resolved in one vectorized pass.
+    visit_rank = np.full(flat.size + 1, -1)
+    visit_rank[empty] = np.arange(len(empty))
+    neighbor_rank = visit_rank[neighbors]
+    earlier = (neighbor_rank >= 0) & (neighbor_rank < np.arange(len(empty))[:, None])
+    source = np.maximum(neighbor_rank, 0)
+    
+    wave = np.zeros(len(empty), dtype=int)
+    while True:
+        deeper = np.where(earlier, wave[source] + 1, 0).max(axis=1)
+        if np.array_equal(deeper, wave):
+            break
+        wave = deeper
+    
+    for w in range(1, wave.max() + 1):
+        idx = np.flatnonzero(wave == w)
+        cell_types = types[idx].copy()
+        seen = earlier[idx]
+        cell_types[seen] = winners[source[idx][seen]]
+        
+        wave_winners = pick_winners(cell_types, fits[idx], rolls[idx])
+        wave_winners[(wave_winners == 2) & (mutation_rolls[idx] < mutation_rate)] = 3
+        winners[idx] = wave_winners
+    
+    grid.flat[empty] = winners
+    return grid
+
 def initialize_natural_tumor():
     """
     Robust Tumor Generator.
@@ -32,34 +112,8 @@ def initialize_natural_tumor():
             death_mask[grid == 0] = False
             grid[death_mask] = 0
             
-            # Reproduction
-            empty_x, empty_y = np.where(grid == 0)
-            if len(empty_x) > 0:
-                indices = np.arange(len(empty_x))
-                np.random.shuffle(indices)
-                
-                for k in indices:
-                    x, y = empty_x[k], empty_y[k]
-                    neighbors = []
-                    fits = []
-                    for dx in [-1, 0, 1]:
-                        for dy in [-1, 0, 1]:
-                            if dx==0 and dy==0: continue
-                            nx, ny = (x+dx)%config.GRID_SIZE, (y+dy)%config.GRID_SIZE
-                            nt = grid[nx, ny]
-                            if nt != 0:
-                                neighbors.append(nt)
-                                fits.append(fitness_map[nx, ny])
-                    
-                    if not neighbors: continue
-                    fits = np.array(fits)
-                    if np.sum(fits) == 0: continue
-                    winner = np.random.choice(neighbors, p=fits/np.sum(fits))
-                    
-                    # Mutation
-                    if winner == 2 and np.random.random() < mutation_rate:
-                        winner = 3 
-                    grid[x, y] = winner
+            # Reproduction (with S -> R mutation)
+            reproduce(grid, fitness_map, mutation_rate)
             
             # Check Size
             current_size = np.sum(grid > 1)
@@ -75,46 +129,81 @@ def initialize_natural_tumor():
             # If failed/died out, the loop restarts automatically
             pass
 
+def hybrid_step(grid, drug_conc, hybrid_state):
+    """
+    Same as step(), but only the fine (near-tumor) cells are simulated as
+    agents; coarse blocks are advanced as density fields.
+    """
+    # Tumor everywhere -> nothing to coarsen, plain step
+    if not hybrid_state['coarse'].any():
+        grid = step(grid, drug_conc)
+        spatial_hybrid.update_resolution(grid, hybrid_state)
+        return grid
+    
+    fine = hybrid_state['fine_cells']
+    flat = grid.ravel()
+    
+    # Fitness: mean-field in coarse blocks, per cell in fine blocks
+    fitness_map = spatial_hybrid.coarse_fitness_map(grid, hybrid_state, drug_conc)
+    fitness_map.ravel()[fine] = spatial_dynamics.calculate_fitness_grid(grid, drug_conc, cells=fine)
+    
+    # Death (fine cells only)
+    types = flat[fine]
+    death_probs = spatial_dynamics.death_probabilities(types, drug_conc)
+    kill_mask = (np.random.random(len(fine)) < death_probs) & (types != 0)
+    flat[fine[kill_mask]] = 0
+    
+    reproduce(grid, fitness_map, cells=fine)
+    
+    # Coarse blocks + re-balance which blocks are agents
+    spatial_hybrid.advance_coarse(hybrid_state, drug_conc)
+    spatial_hybrid.update_resolution(grid, hybrid_state)
+    return grid
+
 def step(grid, drug_conc):
     # Standard Step (Same as before)
     fitness_map = spatial_dynamics.calculate_fitness_grid(grid, drug_conc)
     
-    death_probs = np.full(grid.shape, config.NATURAL_DEATH_RATE)
-    if drug_conc > 0:
-        death_probs[grid == 2] += (drug_conc * 0.15) 
+    death_probs = spatial_dynamics.death_probabilities(grid, drug_conc)
         
     random_roll = np.random.random(grid.shape)
     kill_mask = random_roll < death_probs
     kill_mask[grid == 0] = False
     grid[kill_mask] = 0
     
-    empty_x, empty_y = np.where(grid == 0)
-    if len(empty_x) > 0:
-        indices = np.arange(len(empty_x))
-        np.random.shuffle(indices)
-        for i in indices:
-            x, y = empty_x[i], empty_y[i]
-            neighbors = []
-            fits = []
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    if dx==0 and dy==0: continue
-                    nx, ny = (x+dx)%config.GRID_SIZE, (y+dy)%config.GRID_SIZE
-                    nt = grid[nx, ny]
-                    if nt != 0:
-                        neighbors.append(nt)
-                        fits.append(fitness_map[nx, ny])
-            if not neighbors: continue
-            fits = np.array(fits)
-            if np.sum(fits) == 0: continue
-            winner = np.random.choice(neighbors, p=fits/np.sum(fits))
-            grid[x, y] = winner
+    reproduce(grid, fitness_map)
             
     return grid
 
-def run(policy_func):
+def get_census(grid):
+    """
+    Fractions of the grid occupied by Healthy, Sensitive and Resistant cells.
+    """
+    counts = np.bincount(grid.ravel(), minlength=4)
+    total = grid.size
+    return counts[1] / total, counts[2] / total, counts[3] / total
+
+def schedule_doses(schedule, steps):
+    """
+    Dose at each step from a piecewise-constant (start step, dose) schedule.
+    """
+    starts = np.array([start for start, _ in schedule], dtype=float)
+    doses = np.array([dose for _, dose in schedule], dtype=float)
+    idx = np.searchsorted(starts, steps, side='right') - 1
+    return np.where(idx >= 0, doses[np.maximum(idx, 0)], 0.0)
+
+def run(policy_func, record_trajectory=False, hybrid=False):
     grid = initialize_natural_tumor()
     
+    # Fixed schedules (spatial_strategies.piecewise_constant) skip the
+    # per-step policy calls
+    schedule = getattr(policy_func, 'schedule', None)
+    if schedule is not None:
+        planned_doses = schedule_doses(schedule, np.arange(config.TIME_STEPS))
+    
+    # Optional hybrid mode: far-from-tumor blocks as density fields
+    hybrid_state = spatial_hybrid.init_state(grid) if hybrid else None
+    
     history_h, history_s, history_r = [], [], []
     history_drug, history_tox = [], []
     
@@ -123,12 +212,18 @@ def run(policy_func):
     
     snapshots = []
     
+    # Optional full-run recording (every step, compressed)
+    recorder = spatial_recording.TrajectoryRecorder() if record_trajectory else None
+    
     # Dynamic snapshot times
     T = config.TIME_STEPS
     snapshot_times = [0, int(T*0.33), int(T*0.66), T-1]
     
     for t in range(config.TIME_STEPS):
-        drug = policy_func(grid, t, policy_state)
+        if schedule is not None:
+            drug = planned_doses[t]
+        else:
+            drug = policy_func(grid, t, policy_state)
         total_tox += drug
 
         if total_tox > config.TOX_LIMIT:
@@ -138,20 +233,24 @@ def run(policy_func):
             # or pad them. The plotting function usually handles shorter arrays fine.
             break
         
-        grid = step(grid, drug)
+        if hybrid_state is not None:
+            grid = hybrid_step(grid, drug, hybrid_state)
+        else:
+            grid = step(grid, drug)
         
-        unique, counts = np.unique(grid, return_counts=True)
-        counts_dict = dict(zip(unique, counts))
-        total = config.GRID_SIZE**2
+        h, s, r = get_census(grid)
         
-        history_h.append(counts_dict.get(1, 0) / total)
-        history_s.append(counts_dict.get(2, 0) / total)
-        history_r.append(counts_dict.get(3, 0) / total)
+        history_h.append(h)
+        history_s.append(s)
+        history_r.append(r)
         history_drug.append(drug)
         history_tox.append(total_tox)
         
         if t in snapshot_times:
             snapshots.append(grid.copy())
+        
+        if recorder is not None:
+            recorder.record(grid)
             
     actual_steps = len(history_h)
     
@@ -163,5 +262,6 @@ def run(policy_func):
         'drug': history_drug, 
         'tox': history_tox,
         'snapshots': snapshots,
-        'snap_times': snapshot_times
+        'snap_times': snapshot_times,
+        'trajectory': recorder
     }
\ No newline at end of file
@@ -1,4 +1,5 @@
 import numpy as np
+import spatial_simulation
 import config
 
 def get_population_counts(grid):
@@ -15,13 +16,24 @@ def get_population_counts(grid):
     tumor_size = (n_s + n_r) / (config.GRID_SIZE**2) 
     return tumor_size, n_s, n_r
 
+def piecewise_constant(*segments):
+    """
+    Builds a fixed-schedule policy from (start step, dose) segments, each
+    dose held until the next start. The policy returns the scheduled dose
+    and carries the segments as `.schedule`, so spatial_simulation.run can
+    look up the whole dose history at once instead of calling it every step.
+    """
+    schedule = list(segments)
+    def policy(grid, step, state):
+        return float(spatial_simulation.schedule_doses(schedule, step))
+    policy.schedule = schedule
+    return policy
+
 # POLICY A: MTD
-def mtd_policy(grid, step, state):
-    return 1.0
+mtd_policy = piecewise_constant((0, 1.0))
 
 # POLICY B: METRONOMIC
-def metronomic_policy(grid, step, state):
-    return 0.4
+metronomic_policy = piecewise_constant((0, 0.4))
 
 # POLICY C: ADAPTIVE (NASH)
 def adaptive_policy(grid, step, state):
@@ -0,0 +1,92 @@
+import numpy as np
+import config
+
+# ==========================================
+# LATTICE TOPOLOGY (NEIGHBOR INDEX TABLES)
+# ==========================================
+# Each grid cell is addressed by its flat index (row * cols + col).
+# A neighbor table is an int32 array of shape (num_cells, k):
+# row i lists the flat indices of the k neighbors of cell i.
+# Neighbors that fall outside a closed boundary point to the SENTINEL
+# slot (index num_cells), which callers fill with 0 (Empty) or 0.0.
+# Tables are built once per (shape, neighborhood, boundary) and cached,
+# so the simulation loop never does modulo arithmetic itself.
+
+# (d_row, d_col) offsets for square lattices
+MOORE_OFFSETS = [(-1, -1), (-1, 0), (-1, 1),
+                 ( 0, -1),          ( 0, 1),
+                 ( 1, -1), ( 1, 0), ( 1, 1)]
+
+VON_NEUMANN_OFFSETS = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+
+# Hexagonal lattice stored as "odd-r" offset rows:
+# odd rows are shifted half a cell to the right.
+HEX_EVEN_ROW_OFFSETS = [(-1, -1), (-1, 0), (0, -1), (0, 1), (1, -1), (1, 0)]
+HEX_ODD_ROW_OFFSETS = [(-1, 0), (-1, 1), (0, -1), (0, 1), (1, 0), (1, 1)]
+
+NEIGHBORHOODS = ['moore', 'von_neumann', 'hexagonal']
+BOUNDARIES = ['periodic', 'closed']
+
+_TABLE_CACHE = {}
+
+def _row_offsets(neighborhood, rows):
+    # Returns a (rows, k, 2) array of offsets (hex offsets depend on row parity)
+    if neighborhood == 'moore':
+        offsets = np.array(MOORE_OFFSETS)
+        return np.broadcast_to(offsets, (rows,) + offsets.shape)
+    if neighborhood == 'von_neumann':
+        offsets = np.array(VON_NEUMANN_OFFSETS)
+        return np.broadcast_to(offsets, (rows,) + offsets.shape)
+    if neighborhood == 'hexagonal':
+        even = np.array(HEX_EVEN_ROW_OFFSETS)
+        odd = np.array(HEX_ODD_ROW_OFFSETS)
+        return np.where((np.arange(rows) % 2 == 1)[:, None, None], odd, even)
+    raise ValueError(f"Unknown neighborhood '{neighborhood}' (expected one of {NEIGHBORHOODS})")
+
+def build_neighbor_table(shape, neighborhood, boundary):
+    """
+    Builds the flat int32 neighbor table for a grid shape.
+    """
+    if boundary not in BOUNDARIES:
+        raise ValueError(f"Unknown boundary '{boundary}' (expected one of {BOUNDARIES})")
+    rows, cols = shape
+    # Odd-r rows only line up across the wrap if the row count is even
+    if neighborhood == 'hexagonal' and boundary == 'periodic' and rows % 2:
+        raise ValueError(f"Periodic hexagonal lattice needs an even number of rows (got {rows})")
+
+    # 1. Offsets for every cell: (rows, cols, k, 2)
+    offsets = _row_offsets(neighborhood, rows)
+    offsets = np.broadcast_to(offsets[:, None], (rows, cols) + offsets.shape[1:])
+
+    # 2. Absolute neighbor coordinates
+    r = np.arange(rows)[:, None, None] + offsets[..., 0]
+    c = np.arange(cols)[None, :, None] + offsets[..., 1]
+
+    # 3. Apply the boundary condition
+    if boundary == 'periodic':
+        r = r % rows
+        c = c % cols
+        table = r * cols + c
+    else:
+        inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        table = np.where(inside, r * cols + c, rows * cols)  # Sentinel slot
+
+    return table.reshape(rows * cols, -1).astype(np.int32)
+
+def get_neighbor_table(shape, neighborhood=None, boundary=None):
+    """
+    Cached neighbor table for the configured (or given) topology.
+    """
+    if neighborhood is None: neighborhood = config.NEIGHBORHOOD
+    if boundary is None: boundary = config.BOUNDARY
+
+    key = (tuple(shape), neighborhood, boundary)
+    if key not in _TABLE_CACHE:
+        _TABLE_CACHE[key] = build_neighbor_table(tuple(shape), neighborhood, boundary)
+    return _TABLE_CACHE[key]
+
+def with_sentinel(flat_values, fill=0):
+    """
+    Appends the sentinel slot so table lookups never need bounds checks.
+    """
+    return np.append(flat_values, np.array(fill, dtype=flat_values.dtype))
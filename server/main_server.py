@@ -0,0 +1,40 @@
+import asyncio
+import sys
+import sim_server
+
+POLICIES = ['mtd_policy', 'metronomic_policy', 'adaptive_policy', 'stackelberg_policy']
+
+async def demo():
+    # All built-in policies on both levels, as concurrent sessions
+    with sim_server.SimulationServer() as server:
+        runs = [(level, name) for level in (1, 2) for name in POLICIES]
+        results = await asyncio.gather(*[sim_server.run_policy(server, level, name)
+                                         for level, name in runs])
+
+        for (level, name), history in zip(runs, results):
+            final = history[-1]
+            status = "DIED" if final['died'] else "alive"
+            print(f"Level {level} {name:20s} steps={final['step']:5d} "
+                  f"tumor={final['tumor']:.3f} tox={final['tox']:.1f} ({status})")
+
+        stats = server.stats()
+        print(f"Throughput: {stats['steps_per_sec']:.0f} session-steps/sec "
+              f"({stats['steps']} steps in {stats['elapsed']:.1f}s)")
+
+async def serve():
+    with sim_server.SimulationServer() as server:
+        srv = await server.listen()
+        print(f"Serving on {sim_server.HOST}:{sim_server.PORT} (Ctrl+C to stop)")
+        async with srv:
+            await srv.serve_forever()
+
+def main():
+    if '--serve' in sys.argv:
+        asyncio.run(serve())
+    else:
+        print("Running built-in policies through the simulation server...")
+        asyncio.run(demo())
+        print("Done.")
+
+if __name__ == "__main__":
+    main()
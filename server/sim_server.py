@@ -0,0 +1,344 @@
+import asyncio
+import concurrent.futures
+import importlib
+import itertools
+import json
+import os
+import sys
+import time
+import types
+import numpy as np
+
+# ==========================================
+# LOCAL SIMULATION SERVER
+# ==========================================
+# Hosts many concurrent Level 1 / Level 2 patient sessions for closed-loop
+# experiments where the dose comes from an outside process.
+#
+# Protocol: newline-delimited JSON, one session per connection.
+#   client -> {"level": 1 | 2, "seed": optional int}     (open session;
+#             the seed fixes the whole Level 2 trajectory for given doses)
+#   server -> observation
+#   client -> {"dose": float}                             (repeat...)
+#   server -> observation                                 (until "done")
+# Observation:
+#   {"session", "level", "step", "t", "census": [h, s, r],
+#    "tumor", "tox", "done", "died"}
+# "t" is the time argument the next dose belongs to (same value the
+# built-in policies receive).
+#
+# Simulation steps run in a process pool, so a slow spatial session never
+# blocks the event loop or the other sessions.
+
+HOST = '127.0.0.1'
+PORT = 8765
+WORKERS = os.cpu_count() or 1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEVEL_DIRS = {1: os.path.join(ROOT, 'lvl1'), 2: os.path.join(ROOT, 'lvl2')}
+LEVEL_MODULES = {
+    1: ['config', 'dynamics', 'simulation', 'policies'],
+    2: ['config', 'spatial_topology', 'spatial_dynamics', 'spatial_recording',
+        'spatial_hybrid', 'spatial_simulation', 'spatial_strategies'],
+}
+
+_LEVELS = {}
+
+# ==========================================
+# LEVEL LOADING
+# ==========================================
+def load_level(level):
+    """
+    Imports one level's modules in isolation.
+    Both levels use plain top-level names ('config', ...), so each level is
+    imported with its own directory on the path and then removed from
+    sys.modules again; the modules keep referring to their own config.
+    """
+    if level in _LEVELS:
+        return _LEVELS[level]
+    if level not in LEVEL_DIRS:
+        raise ValueError(f"Unknown level {level} (expected 1 or 2)")
+
+    names = set(itertools.chain.from_iterable(LEVEL_MODULES.values()))
+    saved = {name: sys.modules.pop(name) for name in names if name in sys.modules}
+    sys.path.insert(0, LEVEL_DIRS[level])
+    try:
+        modules = {name: importlib.import_module(name) for name in LEVEL_MODULES[level]}
+    finally:
+        sys.path.remove(LEVEL_DIRS[level])
+        for name in names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+    _LEVELS[level] = types.SimpleNamespace(**modules)
+    return _LEVELS[level]
+
+# ==========================================
+# WORKER FUNCTIONS (run in the process pool)
+# ==========================================
+# Level 2 uses the global np.random. Each session carries its own RNG
+# state, which is installed before and captured after every call, so a
+# session's trajectory depends only on its seed, never on which worker
+# runs a step or what other sessions did there. Level 1 is deterministic.
+
+def _new_state(level, seed):
+    """
+    Returns (state, rng_state) for a new session.
+    """
+    lv = load_level(level)
+    if level == 1:
+        return np.array(lv.config.INITIAL_POP, dtype=float), None
+    np.random.set_state(np.random.RandomState(seed).get_state())
+    grid = lv.spatial_simulation.initialize_natural_tumor()
+    return grid, np.random.get_state()
+
+def _advance(level, state, rng_state, t, dose):
+    """
+    Returns (state, rng_state) after one step.
+    """
+    lv = load_level(level)
+    if level == 1:
+        return lv.simulation.advance(state, t, dose), None
+    np.random.set_state(rng_state)
+    grid = lv.spatial_simulation.step(state, dose)
+    return grid, np.random.get_state()
+
+# ==========================================
+# SESSIONS
+# ==========================================
+class Session:
+    """
+    One simulated patient. Mirrors the bookkeeping of simulation.run
+    (Level 1) and spatial_simulation.run (Level 2).
+    """
+    def __init__(self, server, session_id, level):
+        self.server = server
+        self.id = session_id
+        self.level = level
+        self.lv = load_level(level)
+        self.state = None
+        self.rng_state = None
+        self.step = 0
+        self.tox = 0.0
+        self.died = False
+
+        cfg = self.lv.config
+        if level == 1:
+            self.time_points = np.arange(0, cfg.TIME_STEPS, cfg.DT)
+            self.max_steps = len(self.time_points) - 1
+        else:
+            self.max_steps = cfg.TIME_STEPS
+
+    async def start(self, seed=None):
+        self.state, self.rng_state = await self.server.submit(_new_state, self.level, seed)
+        return self.observe()
+
+    @property
+    def t(self):
+        # Time argument for the next dose decision
+        if self.level == 1:
+            return float(self.time_points[min(self.step + 1, self.max_steps)])
+        return self.step
+
+    @property
+    def done(self):
+        return self.died or self.step >= self.max_steps
+
+    def census(self):
+        if self.level == 1:
+            return [float(v) for v in self.state]
+        return [float(v) for v in self.lv.spatial_simulation.get_census(self.state)]
+
+    def observe(self):
+        census = self.census()
+        return {
+            'session': self.id,
+            'level': self.level,
+            'step': self.step,
+            't': self.t,
+            'census': census,
+            'tumor': census[1] + census[2],
+            'tox': self.tox,
+            'done': self.done,
+            'died': self.died,
+        }
+
+    async def advance(self, dose):
+        if self.done:
+            raise RuntimeError(f"Session {self.id} is finished")
+        dose = float(dose)
+
+        # Toxicity (Level 1 integrates over DT, Level 2 has a lethal limit)
+        if self.level == 1:
+            self.tox += dose * self.lv.config.DT
+        else:
+            self.tox += dose
+            if self.tox > self.lv.config.TOX_LIMIT:
+                self.died = True
+                return self.observe()
+
+        self.state, self.rng_state = await self.server.submit(
+            _advance, self.level, self.state, self.rng_state, self.t, dose)
+        self.step += 1
+        self.server.steps_done += 1
+        return self.observe()
+
+# ==========================================
+# SERVER
+# ==========================================
+class SimulationServer:
+    def __init__(self, workers=None):
+        self.workers = workers or WORKERS
+        self.executor = None
+        self.sessions = {}
+        self.steps_done = 0
+        self.started_at = None
+        self._ids = itertools.count(1)
+        self._servers = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+            self.started_at = time.perf_counter()
+
+    def close(self):
+        for srv in self._servers:
+            srv.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def submit(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def open_session(self, level, seed=None):
+        """
+        Creates a session; returns (session, first observation).
+        """
+        self.open()
+        session = Session(self, next(self._ids), level)
+        self.sessions[session.id] = session
+        obs = await session.start(seed)
+        return session, obs
+
+    def close_session(self, session):
+        self.sessions.pop(session.id, None)
+
+    def stats(self):
+        """
+        Throughput in session-steps per second since the pool was opened.
+        """
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'active_sessions': len(self.sessions),
+            'steps': self.steps_done,
+            'elapsed': elapsed,
+            'steps_per_sec': self.steps_done / elapsed if elapsed > 0 else 0.0,
+        }
+
+    # --- Socket front end ---
+    async def listen(self, host=HOST, port=PORT, path=None):
+        """
+        Starts accepting connections on localhost TCP, or a Unix socket if
+        `path` is given.
+        """
+        self.open()
+        if path is not None:
+            srv = await asyncio.start_unix_server(self.handle_client, path=path)
+        else:
+            srv = await asyncio.start_server(self.handle_client, host=host, port=port)
+        self._servers.append(srv)
+        return srv
+
+    async def handle_client(self, reader, writer):
+        session = None
+        try:
+            request = await _read_message(reader)
+            if request is None:
+                return
+            session, obs = await self.open_session(int(request['level']), request.get('seed'))
+            await _write_message(writer, obs)
+
+            while not obs['done']:
+                request = await _read_message(reader)
+                if request is None:
+                    break  # Controller disconnected
+                obs = await session.advance(request['dose'])
+                await _write_message(writer, obs)
+        except KeyError as e:
+            await _write_message(writer, {'error': f"Missing field {e}"})
+        except (ValueError, TypeError, RuntimeError) as e:
+            await _write_message(writer, {'error': str(e)})
+        finally:
+            if session is not None:
+                self.close_session(session)
+            writer.close()
+
+async def _read_message(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+async def _write_message(writer, message):
+    writer.write((json.dumps(message) + '\n').encode())
+    await writer.drain()
+
+# ==========================================
+# BUILT-IN (IN-PROCESS) CLIENTS
+# ==========================================
+async def run_policy(server, level, policy_name, seed=None):
+    """
+    Drives one session with a function from policies.py (Level 1) or
+    spatial_strategies.py (Level 2), without going through a socket.
+    Returns the list of observations.
+    """
+    lv = load_level(level)
+    if level == 1:
+        policy_func = getattr(lv.policies, policy_name)
+    else:
+        policy_func = getattr(lv.spatial_strategies, policy_name)
+
+    session, obs = await server.open_session(level, seed)
+    history = [obs]
+    policy_state = {}
+    try:
+        while not obs['done']:
+            if level == 1:
+                dose = policy_func(obs['t'], session.state, policy_state)
+            else:
+                dose = policy_func(session.state, obs['t'], policy_state)
+            obs = await session.advance(dose)
+            history.append(obs)
+    finally:
+        server.close_session(session)
+    return history
+
+async def remote_session(policy_func, level, host=HOST, port=PORT, path=None, seed=None):
+    """
+    Minimal external controller: drives a session over the socket with a
+    function of the observation dict. Returns the list of observations.
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    await _write_message(writer, {'level': level, 'seed': seed})
+    obs = await _read_message(reader)
+    history = [obs]
+    while 'error' not in obs and not obs['done']:
+        await _write_message(writer, {'dose': policy_func(obs)})
+        obs = await _read_message(reader)
+        history.append(obs)
+
+    writer.close()
+    return history